@@ -1,29 +1,25 @@
 #!/usr/bin/env python
 import glob
 import os
+import sys
 
-from mistune import BlockLexer
-
-
-def _find_descr(blocks):
-    "The first paragraph is interpreted as the description."
-    for block in blocks:
-        if block["type"] == "paragraph":
-            return block["text"]
+# The README metadata cache is shared with projects/flow-test.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects"))
+from readme_metadata import read_metadata  # noqa: E402
 
 
 def generate_project_overview(file):
     file.write("## Project Overview\n\n")
 
-    for fn in sorted(
+    filenames = sorted(
         glob.glob("projects/*/README.md"), key=lambda fn: (fn.count("."), fn)
-    ):
+    )
+    metadata = read_metadata(filenames)
+    for fn in filenames:
         dirname = os.path.dirname(fn)
         project_name = os.path.basename(dirname)
         file.write(f"### [{project_name}]({os.path.basename(dirname)}/)\n\n")
-        with open(fn) as readme:
-            files = BlockLexer().parse(readme.read())
-            file.write(_find_descr(files) + "\n\n")
+        file.write(metadata[fn]["description"] + "\n\n")
 
 
 def parse_readme(readme):
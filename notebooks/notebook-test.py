@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""Execute the tutorial notebooks concurrently and check their cell timings.
+
+Notebooks that use the same signac projects are executed one after another,
+in the order of their file names, in their own temporary copy of the
+notebooks directory. These groups of notebooks are executed concurrently.
+The execution time and the peak memory of the kernel during every code cell
+are recorded. The test fails if a cell raises an error, times out, or kills
+the kernel, or if a cell becomes slower or uses more memory than in the
+stored baseline by more than the threshold.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+
+import nbformat
+from nbclient import NotebookClient
+from nbclient.exceptions import CellExecutionError, CellTimeoutError, DeadKernelError
+
+logger = logging.getLogger()
+
+NOTEBOOK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(NOTEBOOK_DIR, "notebook-baseline.json")
+
+# Matches the paths of the signac projects used by a notebook.
+PROJECT_PATTERN = re.compile(r"projects/([\w.-]+)")
+
+# Prints the peak resident set size of the kernel process in KiB since the
+# last probe and resets it, so that the peak of each cell is measured. Prints
+# None where /proc is not available, e.g. on macOS.
+MEMORY_PROBE = """\
+try:
+    with open("/proc/self/status") as _probe:
+        _peak = next(line.split()[1] for line in _probe if line.startswith("VmHWM:"))
+    with open("/proc/self/clear_refs", "w") as _probe:
+        _probe.write("5")
+    print(_peak)
+    del _probe, _peak
+except OSError:
+    print(None)
+"""
+
+
+def _cell_hash(cell):
+    "Cells are only compared to the baseline if their source did not change."
+    return hashlib.sha1(cell.source.encode()).hexdigest()
+
+
+def group_notebooks(paths):
+    """Group the notebooks that use the same signac projects.
+
+    Returns a list of groups, each a list of notebook paths in the order of
+    their file names.
+    """
+    groups = []
+    for path in sorted(paths):
+        notebook = nbformat.read(path, as_version=4)
+        projects = {
+            project
+            for cell in notebook.cells
+            if cell.cell_type == "code"
+            for project in PROJECT_PATTERN.findall(cell.source)
+        }
+        group = [path]
+        for other_projects, other_group in list(groups):
+            if projects & other_projects:
+                groups.remove((other_projects, other_group))
+                projects |= other_projects
+                group = other_group + group
+        groups.append((projects, sorted(group)))
+    return [group for _, group in groups]
+
+
+def run_notebook(path, cwd, timeout):
+    """Execute the notebook at path in cwd and record the timing of each code cell.
+
+    Returns the list of code cells with their index, source hash, execution
+    time in seconds and peak memory of the kernel during the cell in MiB (None
+    if unknown), and the error message of the first failing cell, if any. Cells fail if they
+    raise an error, time out, or kill the kernel.
+    """
+    notebook = nbformat.read(path, as_version=4)
+    code_cells = [
+        (index, cell)
+        for index, cell in enumerate(notebook.cells)
+        if cell.cell_type == "code"
+    ]
+    # The client stores every executed cell in the notebook at its index, so
+    # the probes are executed as an additional cell at the end.
+    probe_index = len(notebook.cells)
+    notebook.cells.append(nbformat.v4.new_code_cell(MEMORY_PROBE))
+    cells = []
+    error = None
+    client = NotebookClient(
+        notebook, timeout=timeout, resources={"metadata": {"path": cwd}}
+    )
+
+    def probe_memory():
+        probe = nbformat.v4.new_code_cell(MEMORY_PROBE)
+        client.execute_cell(probe, probe_index)
+        text = probe.outputs[0]["text"].strip()
+        return None if text == "None" else int(text) / 1024
+
+    with client.setup_kernel():
+        index = None
+        try:
+            probe_memory()
+            for index, cell in code_cells:
+                start = time.perf_counter()
+                client.execute_cell(cell, index)
+                elapsed = time.perf_counter() - start
+                cells.append(
+                    {
+                        "index": index,
+                        "hash": _cell_hash(cell),
+                        "time": elapsed,
+                        "peak_memory": probe_memory(),
+                    }
+                )
+        except (CellExecutionError, CellTimeoutError, DeadKernelError) as exception:
+            failed = "The memory probe" if index is None else f"Cell {index}"
+            error = f"{failed} failed:\n{exception}"
+    return cells, error
+
+
+def run_group(paths, timeout):
+    """Execute a group of notebooks in a temporary copy of the notebooks directory.
+
+    Returns a list with the path, the cells and the error of each notebook.
+    """
+    with TemporaryDirectory() as tmp:
+        cwd = shutil.copytree(
+            NOTEBOOK_DIR,
+            os.path.join(tmp, "notebooks"),
+            ignore=shutil.ignore_patterns("projects"),
+        )
+        return [(path, *run_notebook(path, cwd, timeout)) for path in paths]
+
+
+def find_regressions(cells, baseline_cells, threshold, min_time):
+    """Yield a message for each cell that regressed compared to the baseline.
+
+    A cell regressed if its time increased by more than the fraction
+    threshold and by more than min_time seconds, or if its peak memory
+    increased by more than the fraction threshold.
+    """
+    baseline = {(cell["index"], cell["hash"]): cell for cell in baseline_cells}
+    for cell in cells:
+        reference = baseline.get((cell["index"], cell["hash"]))
+        if reference is None:
+            continue
+        if (
+            cell["time"] > (1 + threshold) * reference["time"]
+            and cell["time"] - reference["time"] > min_time
+        ):
+            yield (
+                f"Cell {cell['index']} took {cell['time']:.2f} s "
+                f"instead of {reference['time']:.2f} s."
+            )
+        if cell["peak_memory"] is None or reference["peak_memory"] is None:
+            continue
+        if cell["peak_memory"] > (1 + threshold) * reference["peak_memory"]:
+            yield (
+                f"Cell {cell['index']} used {cell['peak_memory']:.0f} MiB "
+                f"instead of {reference['peak_memory']:.0f} MiB."
+            )
+
+
+def main(args):
+    notebooks = args.notebooks or sorted(
+        glob.glob(os.path.join(NOTEBOOK_DIR, "signac_*.ipynb"))
+    )
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        baseline = {}
+
+    failed = False
+    timings = {}
+    groups = group_notebooks(notebooks)
+    with ProcessPoolExecutor(max_workers=args.parallel) as executor:
+        results = executor.map(run_group, groups, [args.timeout] * len(groups))
+        for path, cells, error in (result for group in results for result in group):
+            name = os.path.basename(path)
+            total = sum(cell["time"] for cell in cells)
+            logger.info(f"{name}: {len(cells)} cells in {total:.2f} s")
+            for cell in sorted(cells, key=lambda cell: -cell["time"])[:3]:
+                memory = cell["peak_memory"]
+                logger.debug(
+                    f" - cell {cell['index']}: {cell['time']:.2f} s, "
+                    + ("unknown memory" if memory is None else f"{memory:.0f} MiB")
+                )
+            if error is None:
+                timings[name] = cells
+            else:
+                # a partial run is not stored in the baseline
+                logger.error(f"{name}: {error}")
+                failed = True
+            for message in find_regressions(
+                cells, baseline.get(name, []), args.threshold, args.min_time
+            ):
+                logger.error(f"{name}: {message}")
+                failed = True
+
+    if args.update_baseline:
+        baseline.update(timings)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write("\n")
+        logger.info(f"Updated the baseline '{args.baseline}'.")
+    if failed:
+        raise RuntimeWarning("Test failed.")
+    logger.info("OK")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "notebooks",
+        nargs="*",
+        help="The notebooks to test. Defaults to all tutorial notebooks.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Increase logging verbosity."
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        type=int,
+        help="The number of groups of notebooks executed concurrently.",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=int,
+        default=600,
+        help="Specify a timeout in seconds after which a cell automatically fails.",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        default=BASELINE_FILE,
+        help="The file with the baseline timings of the cells.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="The allowed relative increase of the time and memory of a cell.",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="Time increases of less than this many seconds are not regressions.",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the recorded timings as the new baseline.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(name)s:%(levelname)s:%(message)s" if args.verbose else "%(message)s",
+    )
+    # Do not log the messages exchanged with the kernels.
+    logging.getLogger("traitlets").setLevel(logging.WARNING)
+
+    try:
+        main(args)
+    except RuntimeWarning as w:
+        print(w, file=sys.stderr)
+        sys.exit(1)
@@ -1,41 +1,24 @@
 # Copyright (c) 2017 The Regents of the University of Michigan
 # All rights reserved.
 # This software is licensed under the BSD 3-Clause License.
+import hashlib
+import json
 import logging
 import os
 import subprocess
 import sys
+from importlib.metadata import version
 from shutil import copytree
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
-from mistune import BlockLexer
+from readme_metadata import read_metadata
 
 logger = logging.getLogger()
 
-
-def _find_descr(blocks):
-    "The first paragraph is interpreted as the description."
-    for block in blocks:
-        if block["type"] == "paragraph":
-            return block["text"]
-
-
-def _find_test_code(blocks):
-    "All code blocks within a 'using' or 'testing' section."
-    found = False
-    for block in blocks:
-        if found and block["type"] == "code":
-            yield block["text"]
-        if block["type"] == "heading":
-            found = block["text"].lower() in ("usage", "testing")
-
-
-def _parse_readme(text):
-    blocks = BlockLexer().parse(text)
-    return {
-        "description": _find_descr(blocks),
-        "test_code": "\n".join(_find_test_code(blocks)),
-    }
+# Stores the hash of each project whose tests passed, see _project_hash.
+CACHE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".test_cache.json"
+)
 
 
 def _run_test(path, test_code, output, timeout):
@@ -62,9 +45,9 @@ def _run_test(path, test_code, output, timeout):
 
 
 def run_tests(path, output, timeout):
+    filename = os.path.join(path, "README.md")
     try:
-        with open(os.path.join(path, "README.md")) as file:
-            readme = _parse_readme(file.read())
+        readme = read_metadata([filename])[filename]
     except FileNotFoundError:
         raise RuntimeWarning("README.md file missing.")
     else:
@@ -80,7 +63,49 @@ def run_tests(path, output, timeout):
         logger.info("No test.sh file, skipping tests.")
 
 
+def _project_hash(path):
+    """Return a hash of all files of a project and of the signac versions.
+
+    The tests of a project are skipped if they already passed with the same
+    hash.
+    """
+    sha = hashlib.sha256()
+    for package in ("signac", "signac-flow"):
+        sha.update(f"{package}=={version(package)}\n".encode())
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if name != "__pycache__")
+        for name in sorted(files):
+            filename = os.path.join(root, name)
+            sha.update(os.path.relpath(filename, path).encode() + b"\0")
+            with open(filename, "rb") as file:
+                sha.update(hashlib.sha256(file.read()).digest())
+    return sha.hexdigest()
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _store_result(name, key):
+    cache = _load_cache()
+    cache[name] = key
+    tmp = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+
 def main(args):
+    name = os.path.relpath(os.path.abspath(args.path), os.path.dirname(CACHE_FILE))
+    key = _project_hash(args.path)
+    if not args.force and _load_cache().get(name) == key:
+        logger.info(f"Skipping '{args.path}', it is unchanged since its tests passed.")
+        logger.info("OK (cached)")
+        return
     logger.info(f"Testing '{args.path}'...")
     try:
         if args.output:
@@ -91,6 +116,7 @@ def main(args):
     except RuntimeError as error:
         logger.error(f"Error at line: {error.args[0]}")
         raise RuntimeWarning("Test failed.")
+    _store_result(name, key)
     logger.info("OK")
 
 
@@ -116,6 +142,12 @@ if __name__ == "__main__":
         default=60,
         help="Specify a timeout in seconds after which a test automatically fails.",
     )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Run the tests even if the project is unchanged since its tests passed.",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
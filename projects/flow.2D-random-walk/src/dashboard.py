@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """Create a dashboard for viewing job status and outputs."""
 
+from cached_modules import CachedDocumentList, CachedStatepointList, ThumbnailViewer
 from signac_dashboard import Dashboard
-from signac_dashboard.modules import DocumentList, FileList, ImageViewer, StatepointList
+from signac_dashboard.modules import FileList
 
 if __name__ == "__main__":
     Dashboard(
-        modules=[ImageViewer(), DocumentList(), StatepointList(), FileList()]
+        modules=[
+            ThumbnailViewer(),
+            CachedDocumentList(),
+            CachedStatepointList(),
+            FileList(),
+        ]
     ).main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Opt-in profiling of operations and labels.
+
+Profiling is enabled by setting the environment variable FLOW_PROFILE to the
+name of a JSONL file, e.g.:
+
+    $ FLOW_PROFILE=profile.jsonl python project.py run
+
+For every operation and every call of a label decorated with profiled, one
+record is appended to the file with the wall time and the CPU time in
+seconds, the peak resident set size during the call in MiB, and the bytes
+read and written. The CPU time and the peak resident set size include child
+processes, e.g. of cmd operations. The peak resident set size and the bytes
+are read from /proc and are None where it is not available.
+Execute this module to rank the profiled operations and labels:
+
+    $ python profiler.py profile.jsonl
+"""
+
+import atexit
+import functools
+import json
+import os
+import resource
+import time
+from collections import defaultdict
+
+PROFILE_FILE = os.environ.get("FLOW_PROFILE")
+
+_records = []
+_started = {}
+# The samples of the calls that are currently measured, innermost last.
+_active = []
+
+
+def _io_bytes():
+    """Return the bytes read and written by this process, or None if unknown."""
+    try:
+        with open("/proc/self/io") as file:
+            counters = dict(line.split(": ") for line in file)
+    except OSError:
+        return None, None
+    return int(counters["rchar"]), int(counters["wchar"])
+
+
+def _peak_rss():
+    """Return the peak resident set size of this process in KiB, or None if unknown."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of this process to its current size."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _sample():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "wall": time.perf_counter(),
+        "cpu": usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        "io": _io_bytes(),
+        # The peak resident set size of the largest child process so far, in KiB
+        "children_rss": children.ru_maxrss,
+    }
+
+
+def _update_peaks(peak):
+    """Raise the peak resident set size of all calls measured at the moment."""
+    for sample in _active:
+        if sample["peak_rss"] is not None and peak is not None:
+            sample["peak_rss"] = max(sample["peak_rss"], peak)
+
+
+def _start():
+    """Start measuring a call and return its sample."""
+    # Resetting the peak would lose the peak of enclosing calls so far.
+    _update_peaks(_peak_rss())
+    start = _sample()
+    start["peak_rss"] = 0 if _reset_peak_rss() else None
+    _active.append(start)
+    return start
+
+
+def _record(kind, name, start, jobs):
+    stop = _sample()
+    _update_peaks(_peak_rss())
+    _active.remove(start)
+    peak_rss = start["peak_rss"]
+    if stop["children_rss"] > start["children_rss"]:
+        # A child process of this call was larger than all earlier ones.
+        peak_rss = max(peak_rss or 0, stop["children_rss"])
+    record = {
+        "kind": kind,
+        "name": name,
+        "jobs": [job.id for job in jobs],
+        "wall": stop["wall"] - start["wall"],
+        "cpu": stop["cpu"] - start["cpu"],
+        "peak_rss": None if peak_rss is None else peak_rss / 1024,
+        "read_bytes": None,
+        "write_bytes": None,
+    }
+    if start["io"][0] is not None:
+        record["read_bytes"] = stop["io"][0] - start["io"][0]
+        record["write_bytes"] = stop["io"][1] - start["io"][1]
+    _records.append(record)
+
+
+def flush():
+    """Append the collected records to the profile file."""
+    global _records
+    if _records:
+        with open(PROFILE_FILE, "a") as file:
+            file.write("".join(json.dumps(record) + "\n" for record in _records))
+        _records = []
+
+
+def profiled(func):
+    """Decorator profiling each call of a label or condition function.
+
+    Returns func unchanged if profiling is disabled.
+    """
+    if PROFILE_FILE is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*jobs):
+        start = _start()
+        try:
+            return func(*jobs)
+        finally:
+            _record("label", func.__name__, start, jobs)
+
+    return wrapper
+
+
+def _start_operation(operation_name, *jobs):
+    """Hook function, samples the resource usage before an operation."""
+    _started[operation_name, tuple(job.id for job in jobs)] = _start()
+
+
+def _stop_operation(operation_name, *jobs):
+    """Hook function, records the resource usage of an operation."""
+    start = _started.pop((operation_name, tuple(job.id for job in jobs)))
+    _record("operation", operation_name, start, jobs)
+    # Operations may be executed in worker processes, which do not call the
+    # exit handlers, so the records are written after each operation.
+    flush()
+
+
+def install_hooks(project):
+    """Profile all operations of project if profiling is enabled."""
+    if PROFILE_FILE is None:
+        return
+    project.project_hooks.on_start.append(_start_operation)
+    project.project_hooks.on_exit.append(_stop_operation)
+
+
+if PROFILE_FILE is not None:
+    atexit.register(flush)
+
+
+def summarize(filename, top=None):
+    """Return the rows of a summary of the profile file, sorted by total wall time."""
+    totals = defaultdict(lambda: defaultdict(float))
+    with open(filename) as file:
+        for line in file:
+            record = json.loads(line)
+            total = totals[record["kind"], record["name"]]
+            total["calls"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+            total["peak_rss"] = max(total["peak_rss"], record["peak_rss"] or 0)
+            total["read_bytes"] += record["read_bytes"] or 0
+            total["write_bytes"] += record["write_bytes"] or 0
+    rows = sorted(totals.items(), key=lambda item: -item[1]["wall"])
+    return rows[:top]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Rank the operations and labels of a profile file by wall time."
+    )
+    parser.add_argument("filename", help="The profile file (JSONL).")
+    parser.add_argument(
+        "-n", "--top", type=int, help="Only show this many operations and labels."
+    )
+    args = parser.parse_args()
+    print(
+        f"{'kind':<10} {'name':<36} {'calls':>7} {'wall [s]':>10} {'cpu [s]':>10} "
+        f"{'rss [MiB]':>10} {'read [MB]':>10} {'write [MB]':>10}"
+    )
+    for (kind, name), total in summarize(args.filename, args.top):
+        print(
+            f"{kind:<10} {name:<36} {int(total['calls']):>7} {total['wall']:>10.3f} "
+            f"{total['cpu']:>10.3f} {total['peak_rss']:>10.1f} "
+            f"{total['read_bytes'] / 1e6:>10.2f} {total['write_bytes'] / 1e6:>10.2f}"
+        )
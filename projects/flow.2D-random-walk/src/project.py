@@ -4,6 +4,7 @@
 import flow
 import matplotlib.pyplot as plt
 import numpy as np
+from profiler import install_hooks, profiled
 
 
 def generate_stores(jobs, store_name):
@@ -20,6 +21,7 @@ class RandomWalkProject(flow.FlowProject):
 
 
 @RandomWalkProject.label
+@profiled
 def simulated(job):
     """Return whether the job simulated."""
     return "positions" in job.data
@@ -192,4 +194,6 @@ def plot_histogram(*jobs):
 
 
 if __name__ == "__main__":
-    RandomWalkProject().main()
+    project = RandomWalkProject()
+    install_hooks(project)
+    project.main()
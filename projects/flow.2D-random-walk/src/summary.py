@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Export the state points and documents of all jobs to a single table.
+
+The table has one row per job and one column per flattened state point and
+document key, e.g. `sp.p` for the state point key `p`. It is stored in a
+single npz file in the project directory and updated incrementally: only
+new jobs and jobs whose document was modified since the last export are
+read again. The table can then be analyzed with pandas without opening every
+job directory, using load_summary.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import signac
+
+SUMMARY_FILE = "signac_summary.npz"
+
+
+def flatten(mapping, prefix):
+    """Flatten a nested mapping into a dict with keys joined by dots."""
+    flat = {}
+    for key, value in mapping.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}.{key}"))
+        else:
+            flat[f"{prefix}.{key}"] = value
+    return flat
+
+
+def _document_mtime(job):
+    try:
+        return os.stat(job.document.filename).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+def _read_rows(filename):
+    """Return the rows of an exported table as a dict mapping job ids to rows."""
+    try:
+        with np.load(filename) as data:
+            job_ids, mtimes, rows = data["job_id"], data["mtime"], data["row"]
+    except FileNotFoundError:
+        return {}
+    return {
+        str(job_id): (int(mtime), json.loads(row))
+        for job_id, mtime, row in zip(job_ids, mtimes, rows)
+    }
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _column(values):
+    """Return values as a numeric array if possible, else as an array of strings."""
+    if all(value is None or isinstance(value, (bool, int, float)) for value in values):
+        if None in values:
+            return np.array([np.nan if value is None else value for value in values])
+        return np.array(values)
+    return np.array([_text(value) for value in values])
+
+
+def export_summary(project, filename=None):
+    """Export the state points and documents of all jobs of project to filename.
+
+    Returns the number of jobs that were read again and the total number of
+    jobs.
+    """
+    filename = project.fn(SUMMARY_FILE) if filename is None else filename
+    previous = _read_rows(filename)
+    job_ids, mtimes, rows = [], [], []
+    num_updated = 0
+    for job in project:
+        mtime = _document_mtime(job)
+        if job.id in previous and previous[job.id][0] == mtime:
+            row = previous[job.id][1]
+        else:
+            row = {**flatten(job.sp(), "sp"), **flatten(job.doc(), "doc")}
+            num_updated += 1
+        job_ids.append(job.id)
+        mtimes.append(mtime)
+        rows.append(row)
+    keys = sorted({key for row in rows for key in row})
+    columns = {key: _column([row.get(key) for row in rows]) for key in keys}
+    with open(filename + ".tmp", "wb") as file:
+        np.savez(
+            file,
+            job_id=np.array(job_ids, dtype=str),
+            mtime=np.array(mtimes, dtype=np.int64),
+            row=np.array([json.dumps(row) for row in rows], dtype=str),
+            **columns,
+        )
+    os.replace(filename + ".tmp", filename)
+    return num_updated, len(job_ids)
+
+
+def load_summary(filename=SUMMARY_FILE):
+    """Load an exported table as a pandas DataFrame indexed by job id."""
+    import pandas as pd
+
+    with np.load(filename) as data:
+        columns = {
+            key: data[key]
+            for key in data.files
+            if key not in ("job_id", "mtime", "row")
+        }
+        return pd.DataFrame(columns, index=pd.Index(data["job_id"], name="job_id"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=f"The file to export the table to (default: {SUMMARY_FILE} in the project).",
+    )
+    args = parser.parse_args()
+    num_updated, num_jobs = export_summary(signac.get_project(), args.output)
+    print(f"Updated {num_updated} of {num_jobs} jobs.")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Compare per-rank workspace access with collective broadcast and gather.
+
+Run with several ranks, for example:
+
+    $ mpiexec -n 4 python benchmark.py
+"""
+
+import argparse
+import shutil
+import tempfile
+
+import numpy as np
+import signac
+from mpi4py import MPI
+from project import broadcast_aggregate, compute_result, gather_arrays
+
+
+def load_jobs(path):
+    """Return the jobs of the project at path, ordered by their state point."""
+    return sorted(signac.get_project(path), key=lambda job: job.sp.i)
+
+
+def per_rank_access(path, comm):
+    """Every rank reads the workspace and writes the results of its jobs."""
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    jobs = load_jobs(path)
+    for job in jobs[rank::size]:
+        job.document["result"] = compute_result(job.statepoint(), job.document())
+
+
+def collective_access(path, comm):
+    """Rank 0 broadcasts the inputs and writes the gathered results."""
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    jobs = load_jobs(path) if rank == 0 else None
+    data = broadcast_aggregate(jobs, comm)
+    results = [
+        (index, compute_result(**data[index])) for index in range(rank, len(data), size)
+    ]
+    gathered = gather_arrays(results, comm)
+    if rank == 0:
+        with signac.buffered():
+            for index, result in np.concatenate(gathered).reshape(-1, 2):
+                jobs[int(index)].document["result"] = float(result)
+
+
+def main(args):
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    if rank == 0:
+        tmp = tempfile.mkdtemp()
+        project = signac.init_project(tmp)
+        print(f"Initializing {args.num_jobs} jobs...")
+        for i in range(args.num_jobs):
+            project.open_job({"i": i}).init()
+    else:
+        tmp = None
+    tmp = comm.bcast(tmp, root=0)
+    try:
+        for func in (per_rank_access, collective_access):
+            comm.Barrier()
+            start = MPI.Wtime()
+            func(tmp, comm)
+            comm.Barrier()
+            elapsed = MPI.Wtime() - start
+            if rank == 0:
+                print(
+                    f"{func.__name__}: {elapsed:.2f} s for {args.num_jobs} jobs "
+                    f"on {comm.Get_size()} ranks"
+                )
+    finally:
+        comm.Barrier()
+        if rank == 0:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--num-jobs",
+        type=int,
+        default=1000,
+        help="The number of jobs to benchmark.",
+    )
+    main(parser.parse_args())
@@ -1,3 +1,8 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+import signac
 from flow import FlowProject, aggregator
 
 
@@ -8,6 +13,108 @@ class Project(FlowProject):
 RANKS_PER_JOB = 2
 JOBS_PER_AGGREGATE = 2
 
+# Number of groups of RANKS_PER_JOB ranks that work on the jobs of
+# do_mpi_task_dynamic, in addition to rank 0 which hands out the jobs.
+WORKER_GROUPS = 2
+
+# Message tags of the requests for jobs and of the assigned jobs.
+REQUEST_TAG = 1
+JOB_TAG = 2
+
+
+class CommunicatorPool:
+    """Splits a communicator into groups of ranks and reuses the splits.
+
+    Splitting a communicator is a collective operation, so the split
+    communicators are cached by the number of groups. Aggregates of the same
+    size, executed one after another in a single MPI launch, share them.
+    """
+
+    def __init__(self, comm):
+        self.comm = comm
+        self._splits = {}
+
+    def split(self, num_groups, exclude_root=False):
+        """Return the group index of this rank and the communicator of its group.
+
+        The number of groups is limited to the number of ranks. If the ranks
+        cannot be divided evenly, the group sizes differ by at most one rank.
+        If exclude_root is True, rank 0 is not part of any group and gets the
+        group index None and the null communicator.
+        """
+        from mpi4py import MPI
+
+        offset = 1 if exclude_root else 0
+        size = self.comm.Get_size() - offset
+        rank = self.comm.Get_rank() - offset
+        num_groups = max(1, min(num_groups, size))
+        if (num_groups, exclude_root) not in self._splits:
+            color = MPI.UNDEFINED if rank < 0 else rank * num_groups // size
+            self._splits[num_groups, exclude_root] = (
+                None if rank < 0 else color,
+                self.comm.Split(color, rank),
+            )
+        return self._splits[num_groups, exclude_root]
+
+
+@lru_cache(maxsize=None)
+def get_communicator_pool():
+    """Return the communicator pool of MPI.COMM_WORLD of this process."""
+    from mpi4py import MPI
+
+    return CommunicatorPool(MPI.COMM_WORLD)
+
+
+def bcast_json(data, comm, root=0):
+    """Broadcast JSON-serializable data from root to all ranks.
+
+    The data is encoded once on root and sent with the buffer-based Bcast,
+    instead of pickling it as comm.bcast does.
+    """
+    if comm.Get_rank() == root:
+        buffer = np.frombuffer(json.dumps(data).encode(), dtype=np.uint8)
+        length = np.array([buffer.size], dtype=np.int64)
+    else:
+        length = np.empty(1, dtype=np.int64)
+    comm.Bcast(length, root=root)
+    if comm.Get_rank() != root:
+        buffer = np.empty(length[0], dtype=np.uint8)
+    comm.Bcast(buffer, root=root)
+    return json.loads(buffer.tobytes())
+
+
+def broadcast_aggregate(jobs, comm, root=0):
+    """Broadcast the state points and documents of all jobs of an aggregate.
+
+    Only root reads the workspace, the other ranks do not access signac.
+    Returns a list with the state point and document of each job.
+    """
+    if comm.Get_rank() == root:
+        data = [
+            {"statepoint": job.statepoint(), "document": job.document()} for job in jobs
+        ]
+    else:
+        data = None
+    return bcast_json(data, comm, root=root)
+
+
+def gather_arrays(array, comm, root=0):
+    """Gather arrays of different length from all ranks with Gatherv.
+
+    Returns the list of the flattened arrays of all ranks on root, and None
+    on all other ranks.
+    """
+    array = np.ascontiguousarray(array, dtype=np.float64).ravel()
+    is_root = comm.Get_rank() == root
+    counts = np.empty(comm.Get_size(), dtype=np.int64) if is_root else None
+    comm.Gather(np.array([array.size], dtype=np.int64), counts, root=root)
+    if not is_root:
+        comm.Gatherv(array, None, root=root)
+        return None
+    gathered = np.empty(counts.sum(), dtype=np.float64)
+    comm.Gatherv(array, (gathered, counts), root=root)
+    return np.split(gathered, np.cumsum(counts)[:-1])
+
 
 def mpi_task(job, comm):
     """Does some work for a signac job with a given MPI communicator."""
@@ -18,10 +125,15 @@ def mpi_task(job, comm):
         data = job.statepoint()
     else:
         data = None
-    data = comm.bcast(data, root=0)
+    data = bcast_json(data, comm, root=0)
     print(f"In the mpi_task function, {rank=} of {size=} has {data=}.")
 
 
+def compute_result(statepoint, document):
+    """Computes the result of a job from its state point and document."""
+    return float(statepoint["i"]) ** 2
+
+
 mpi_aggregator = aggregator.groupsof(num=JOBS_PER_AGGREGATE)
 
 
@@ -30,35 +142,133 @@ mpi_aggregator = aggregator.groupsof(num=JOBS_PER_AGGREGATE)
     directives={"nranks": lambda *jobs: RANKS_PER_JOB * len(jobs)},
 )
 def do_mpi_task(*jobs):
-    from mpi4py import MPI
-
-    world_comm = MPI.COMM_WORLD
-    world_rank = world_comm.Get_rank()
-    world_size = world_comm.Get_size()
-    num_jobs = len(jobs)
+    pool = get_communicator_pool()
+    world_rank = pool.comm.Get_rank()
+    world_size = pool.comm.Get_size()
     if world_rank == 0:
         print(
             f"Launching MPI tasks for {len(jobs)} jobs. Rank {world_rank} of {world_size}."
         )
 
-    # Use MPI splitting to make new communicators
-    communicator_size = world_size // num_jobs
-    color = world_rank // communicator_size
-    key = world_rank % communicator_size
-    print(f"{world_rank=}, {color=}, {key=}")
-
-    split_comm = world_comm.Split(color, key)
+    # Use MPI splitting to make new communicators. If there are fewer groups
+    # of RANKS_PER_JOB ranks than jobs, each group runs several jobs in waves.
+    num_groups = max(1, min(len(jobs), world_size // RANKS_PER_JOB))
+    color, split_comm = pool.split(num_groups)
     split_rank = split_comm.Get_rank()
     split_size = split_comm.Get_size()
+    print(f"{world_rank=}, {color=}, {split_rank=}, {split_size=}")
+
+    # Select the jobs from the aggregate to run in the split communicator.
+    for job in jobs[color::num_groups]:
+        print(f"{world_rank=}, {split_rank=}, {split_size=}, {job.statepoint=}")
+
+        # Now you can use the split communicator with your application!
+        # Call your function with job, split_comm:
+        mpi_task(job, split_comm)
+
+
+def distribute_jobs(comm, num_jobs, num_groups):
+    """Hand out the job indices to the groups of workers as they become idle.
 
-    # Select the job from the aggregate to run in the split communicator.
-    job = jobs[color]
+    Runs on rank 0. Every group leader requests a new job with the timing of
+    its previous job, and receives None when no jobs are left. Returns a dict
+    mapping the job indices to their elapsed times.
+    """
+    from mpi4py import MPI
+
+    timings = {}
+    next_index = 0
+    # Each group sends one request per job and one final request
+    for _ in range(num_jobs + num_groups):
+        status = MPI.Status()
+        result = comm.recv(source=MPI.ANY_SOURCE, tag=REQUEST_TAG, status=status)
+        if result is not None:
+            index, elapsed = result
+            timings[index] = elapsed
+        if next_index < num_jobs:
+            comm.send(next_index, dest=status.Get_source(), tag=JOB_TAG)
+            next_index += 1
+        else:
+            comm.send(None, dest=status.Get_source(), tag=JOB_TAG)
+    return timings
 
-    print(f"{world_rank=}, {split_rank=}, {split_size=}, {job.statepoint=}")
 
-    # Now you can use the split communicator with your application!
-    # Call your function with job, split_comm:
-    mpi_task(job, split_comm)
+def work_on_jobs(jobs, comm, split_comm):
+    """Run the jobs assigned by rank 0 on the ranks of split_comm."""
+    from mpi4py import MPI
+
+    result = None
+    while True:
+        if split_comm.Get_rank() == 0:
+            comm.send(result, dest=0, tag=REQUEST_TAG)
+            index = comm.recv(source=0, tag=JOB_TAG)
+        else:
+            index = None
+        index = split_comm.bcast(index, root=0)
+        if index is None:
+            break
+        start = MPI.Wtime()
+        mpi_task(jobs[index], split_comm)
+        split_comm.Barrier()
+        result = (index, MPI.Wtime() - start)
+
+
+@Project.operation(
+    aggregator=aggregator(),
+    directives={"nranks": RANKS_PER_JOB * WORKER_GROUPS + 1},
+)
+def do_mpi_task_dynamic(*jobs):
+    """Run all jobs on groups of ranks, handing out each job to the next idle group.
+
+    Unlike do_mpi_task, the jobs are not bound to groups in advance, so a
+    slow job does not keep the other groups waiting. The elapsed time of
+    each job is written to its document by rank 0.
+    """
+    pool = get_communicator_pool()
+    world_size = pool.comm.Get_size()
+    if world_size == 1:
+        # Without workers, rank 0 runs all jobs itself.
+        from mpi4py import MPI
+
+        for job in jobs:
+            start = MPI.Wtime()
+            mpi_task(job, pool.comm)
+            job.doc.mpi_task_time = MPI.Wtime() - start
+        return
+
+    num_groups = max(1, min(len(jobs), (world_size - 1) // RANKS_PER_JOB))
+    color, split_comm = pool.split(num_groups, exclude_root=True)
+    if color is None:
+        timings = distribute_jobs(pool.comm, len(jobs), num_groups)
+        for index, elapsed in timings.items():
+            jobs[index].doc.mpi_task_time = elapsed
+    else:
+        work_on_jobs(jobs, pool.comm, split_comm)
+
+
+@Project.operation(
+    aggregator=aggregator(),
+    directives={"nranks": RANKS_PER_JOB * WORKER_GROUPS},
+)
+def do_mpi_task_collective(*jobs):
+    """Compute the results of all jobs, accessing the workspace only on rank 0.
+
+    The state points and documents are broadcast once, each rank computes the
+    results of every size-th job, and rank 0 gathers the results and writes
+    them to the job documents in a single buffered write.
+    """
+    comm = get_communicator_pool().comm
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    data = broadcast_aggregate(jobs, comm)
+    results = [
+        (index, compute_result(**data[index])) for index in range(rank, len(jobs), size)
+    ]
+    gathered = gather_arrays(results, comm)
+    if rank == 0:
+        with signac.buffered():
+            for index, result in np.concatenate(gathered).reshape(-1, 2):
+                jobs[int(index)].document["result"] = float(result)
 
 
 if __name__ == "__main__":
@@ -1,66 +1,221 @@
-import matplotlib.pyplot as plt
+import fcntl
+import os
+
+import numpy as np
+import signac
 from flow import FlowProject, aggregator
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# The pressure of each job is stored in its document by compute_cached and
+# its density is a state point value ("document"). They can also be written
+# to the project-level OUTPUT_TABLE ("table"). Set WRITE_TEXT_FILES to also
+# write an output.txt file for each job.
+OUTPUT_MODE = "document"
+OUTPUT_TABLE = "output.npz"
+WRITE_TEXT_FILES = False
 
 
 class Project(FlowProject):
     pass
 
 
-def get_pressure(crystal_name, density):
-    """Pretend function returning a fake pressure value."""
-    if crystal_name == "fcc":
-        pressure = 1000 * density**2
-    else:
-        pressure = 5000 * density**3
-    return pressure
+@Project.label
+def pressure_computed(job):
+    return "pressure" in job.document
+
+
+def get_pressures(crystal_names, densities):
+    """Pretend function returning fake pressure values.
+
+    Computes the pressures of arrays of crystal names and densities at once.
+    """
+    crystal_names = np.asarray(crystal_names)
+    densities = np.asarray(densities, dtype=float)
+    return np.where(crystal_names == "fcc", 1000 * densities**2, 5000 * densities**3)
+
+
+def compute_cached(jobs, name, func, get_inputs):
+    """Return the results of func for all jobs, reusing results from the job documents.
+
+    The inputs of a job are the keyword arguments of func returned by
+    get_inputs(job). The result of each job is stored in its document under
+    name, together with its inputs. Only jobs without a stored result or
+    with different inputs are computed, in a single call of func with lists
+    of the inputs. Aggregates that share jobs thus compute each result once.
+    """
+    inputs = [get_inputs(job) for job in jobs]
+    results = np.empty(len(jobs))
+    missing = []
+    for i, job in enumerate(jobs):
+        cached = job.document.get(name)
+        if cached is not None and cached["inputs"] == inputs[i]:
+            results[i] = cached["result"]
+        else:
+            missing.append(i)
+    if missing:
+        arguments = {
+            key: [inputs[i][key] for i in missing] for key in inputs[missing[0]]
+        }
+        with signac.buffered():
+            for i, result in zip(missing, func(**arguments)):
+                results[i] = result
+                jobs[i].document[name] = {"inputs": inputs[i], "result": float(result)}
+    return results
+
+
+def get_cached_pressures(jobs):
+    """Return the pressures of the jobs, computed only once per job."""
+    return compute_cached(
+        jobs,
+        "pressure",
+        get_pressures,
+        lambda job: {"crystal_names": job.sp.crystal, "densities": job.sp.density},
+    )
+
+
+def update_table(filename, rows):
+    """Update the rows of a columnar table of job values in an npz file.
+
+    The rows are given as a dict mapping job ids to dicts of values. The file
+    is locked while it is updated, and replaced at once.
+    """
+    with open(filename + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        table = read_table(filename)
+        for job_id, values in rows.items():
+            table.setdefault(job_id, {}).update(values)
+        job_ids = sorted(table)
+        keys = sorted({key for values in table.values() for key in values})
+        columns = {
+            key: np.array([table[job_id].get(key, np.nan) for job_id in job_ids])
+            for key in keys
+        }
+        with open(filename + ".tmp", "wb") as file:
+            np.savez(file, job_id=np.array(job_ids, dtype=str), **columns)
+        os.replace(filename + ".tmp", filename)
+
+
+def read_table(filename):
+    """Read a table written by update_table as a dict mapping job ids to values."""
+    try:
+        with np.load(filename) as data:
+            columns = {key: data[key] for key in data.files}
+    except FileNotFoundError:
+        return {}
+    job_ids = columns.pop("job_id")
+    return {
+        str(job_id): {key: float(column[i]) for key, column in columns.items()}
+        for i, job_id in enumerate(job_ids)
+    }
+
+
+class OutputWriter:
+    """Collects scalar values of jobs and writes them all at once.
+
+    On network file systems, creating a small file for each job dominates the
+    runtime. Instead, the values of all jobs are written to a single
+    project-level table in table mode. In document mode, nothing is written,
+    since the values are already stored in the job documents and state
+    points. Text files are only written if text_files is True.
+    """
+
+    def __init__(self, mode=OUTPUT_MODE, text_files=WRITE_TEXT_FILES):
+        if mode not in ("document", "table"):
+            raise ValueError(f"Unknown output mode '{mode}'.")
+        self.mode = mode
+        self.text_files = text_files
+        self._rows = []
+
+    def add(self, job, **values):
+        self._rows.append((job, {key: float(value) for key, value in values.items()}))
+
+    def flush(self):
+        if not self._rows:
+            return
+        if self.mode == "table":
+            project = self._rows[0][0].project
+            update_table(
+                project.fn(OUTPUT_TABLE),
+                {job.id: values for job, values in self._rows},
+            )
+        if self.text_files:
+            for job, values in self._rows:
+                with open(job.fn("output.txt"), "w") as output_file:
+                    output_file.write(
+                        ", ".join(
+                            f"{key.title()}: {value}" for key, value in values.items()
+                        )
+                    )
+        self._rows = []
+
+
+def read_output(job, mode=OUTPUT_MODE):
+    """Return the pressure and density of a job, as written by an OutputWriter."""
+    if mode == "document":
+        return {
+            "pressure": job.document["pressure"]["result"],
+            "density": job.sp.density,
+        }
+    return read_table(job.project.fn(OUTPUT_TABLE))[job.id]
+
+
+def save_plot(filename, title, curves, legend=False):
+    """Plot the curves, given as tuples of label, x, and y, and save the figure.
+
+    The figure is drawn on its own Agg canvas instead of the global pyplot
+    state, so that several plots can be made concurrently, e.g. with
+    `project.py run --parallel`.
+    """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for label, x, y in curves:
+        ax.plot(x, y, label=label)
+    if legend:
+        ax.legend()
+    ax.set_title(title)
+    fig.savefig(filename)
 
 
 @Project.operation(aggregator=aggregator.groupby("crystal", sort_by="density"))
 def plot_pressure_by_crystal(*jobs):
     """Plot the pressure as a function of density for each group."""
-    pressures = {}
-    for job in jobs:
-        crystal_name = job.sp.crystal
-        density = job.sp.density
+    crystal_name = jobs[0].sp.crystal
+    densities = np.array([job.sp.density for job in jobs])
 
-        # In a real workflow, this data would come from a simulation.
-        pressure = get_pressure(crystal_name, density)
-        pressures[density] = pressure
+    # In a real workflow, this data would come from a simulation.
+    pressures = get_cached_pressures(jobs)
 
-        # Write an output file for each job.
-        with open(job.fn("output.txt"), "w") as output_file:
-            output_file.write(f"Pressure: {pressure}, Density: {density}")
+    # Write the output of all jobs at once.
+    writer = OutputWriter()
+    for job, density, pressure in zip(jobs, densities, pressures):
+        writer.add(job, pressure=pressure, density=density)
+    writer.flush()
 
     # Make the plot.
-    fig, ax = plt.subplots()
-    plt.plot(pressures.keys(), pressures.values())
-    plt.title(f"{crystal_name} Density vs. Pressure")
-    plt.savefig(f"{crystal_name}_density_vs_pressure.png")
-    plt.close()
+    save_plot(
+        f"{crystal_name}_density_vs_pressure.png",
+        f"{crystal_name} Density vs. Pressure",
+        [(None, densities, pressures)],
+    )
 
 
 @Project.operation(aggregator=aggregator(sort_by="density"))
 def plot_pressure_all(*jobs):
     """Plot pressure for all data on the same axes."""
-    crystal_pressures = {"fcc": [], "bcc": []}
-    for job in jobs:
-        crystal_name = job.sp.crystal
-        density = job.sp.density
+    crystal_names = np.array([job.sp.crystal for job in jobs])
+    densities = np.array([job.sp.density for job in jobs])
 
-        # In a real workflow, this data would come from a simulation.
-        pressure = get_pressure(crystal_name, density)
-        crystal_pressures[crystal_name].append((density, pressure))
+    # In a real workflow, this data would come from a simulation.
+    pressures = get_cached_pressures(jobs)
 
     # Make the plot.
-    fig, ax = plt.subplots()
-    for crystal_name, densities_and_pressures in crystal_pressures.items():
-        densities = [v[0] for v in densities_and_pressures]
-        pressures = [v[1] for v in densities_and_pressures]
-        plt.plot(densities, pressures, label=crystal_name)
-    plt.legend()
-    plt.title("Density vs. Pressure")
-    plt.savefig("density_vs_pressure.png")
-    plt.close()
+    curves = []
+    for crystal_name in ("fcc", "bcc"):
+        selection = crystal_names == crystal_name
+        curves.append((crystal_name, densities[selection], pressures[selection]))
+    save_plot("density_vs_pressure.png", "Density vs. Pressure", curves, legend=True)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,15 @@
-import pexpect  # Used to automate interaction with GROMACS interface.
+import logging
+import os
+import sys
+import time
+
 import signac
 from flow import FlowProject
 
 gmx_exec = "gmx"  # or use gmx_mpi if available
 
+logger = logging.getLogger(__name__)
+
 """Define file level constants."""
 
 # Configuration file names
@@ -28,6 +34,13 @@ production_file = production_op + ".gro"
 
 nvt_checkpoint = nvt_op + ".cpt"
 npt_checkpoint = npt_op + ".cpt"
+production_checkpoint = production_op + ".cpt"
+production_log = production_op + ".log"
+
+# Requested walltime of the production run in hours. mdrun stops after
+# this fraction of the walltime, leaving time to write the checkpoint.
+production_walltime = 24
+walltime_fraction = 0.95
 
 # pdb2gmx parameters
 force_field = "oplsaa"
@@ -43,12 +56,76 @@ solvent_configuration = "spc216.gro"
 # genion options
 pname = "NA"
 nname = "CL"
+solvent_group = "SOL"  # group of molecules to be replaced by ions
 
 
 class MyProject(FlowProject):
     pass
 
 
+# The preparation steps take only seconds each. Running or submitting the
+# prepare group executes the whole chain in a single invocation, skipping
+# every step whose output file already exists.
+prepare = MyProject.make_group("prepare")
+
+
+class _FileIndex:
+    """Snapshot of the files in each job directory.
+
+    Every label and file condition would otherwise stat its file once per job
+    and status query, which is slow on network file systems. Instead, each
+    job directory is listed once and all conditions are answered from that
+    listing. Operations may run in other processes, e.g. with
+    `run --parallel`, so the listings are only used by commands that do not
+    execute operations; otherwise each condition checks the file directly.
+
+    The flow.gmx-lysozyme-in-water and flow.gmx-mtools examples define the
+    same class, so that each example can be copied on its own.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+
+    def isfile(self, job, filename):
+        if not self.enabled:
+            return os.path.isfile(job.fn(filename))
+        try:
+            files = self._files[job.id]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            try:
+                with os.scandir(job.path) as entries:
+                    files = {entry.name for entry in entries if entry.is_file()}
+            except FileNotFoundError:
+                files = set()
+            self._files[job.id] = files
+        return filename in files
+
+
+_file_index = _FileIndex()
+
+# Commands that evaluate the conditions without executing any operations.
+READ_ONLY_COMMANDS = ("status", "next", "submit")
+
+
+def _command(argv):
+    """Returns the subcommand of the command line, e.g. 'status'."""
+    return next((arg for arg in argv if not arg.startswith("-")), None)
+
+
+def _isfile(filename):
+    """Returns a condition function checking the file index for filename."""
+
+    def isfile(job):
+        return _file_index.isfile(job, filename)
+
+    return isfile
+
+
 """Define labels, which in this case we use to indicate major checkpoints in the workflow."""
 
 
@@ -57,19 +134,40 @@ def prepared_for_simulation(job):
     """Indicates when the various preparation steps
     have been completed and the actual MD simulation
     steps can begin."""
-    return job.isfile(ionized_file)
+    return _file_index.isfile(job, ionized_file)
 
 
 @MyProject.label
 def finished(job):
     """Indicates that the entire workflow has completed
     for this operation."""
-    return job.isfile(production_file)
+    progress = job.doc.get("progress", {})
+    return (
+        _file_index.isfile(job, production_file)
+        and progress.get("nsteps") is not None
+        and progress.get("step") == progress["nsteps"]
+    )
 
 
 """Definition of helper functions for defining operations."""
 
 
+_start_times = {}
+
+
+def _start_timer(operation_name, job):
+    """Hook function, stores the start time of an operation."""
+    _start_times[operation_name, job.id] = time.perf_counter()
+
+
+def _record_timing(operation_name, job):
+    """Hook function, stores the wall time of an operation in the job document."""
+    elapsed = time.perf_counter() - _start_times.pop((operation_name, job.id))
+    job.doc.setdefault("timings", {})
+    job.doc.timings[operation_name] = elapsed
+    print(f"Operation {operation_name} took {elapsed:.2f} s for job {job.id}.")
+
+
 def _grompp_str(op_name, gro_name, checkpoint_file=None):
     """Helper function, returns grompp command string for operation."""
     mdp_file = signac.get_project().fn(f"mdp_files/{op_name}.mdp")
@@ -83,20 +181,56 @@ def _grompp_str(op_name, gro_name, checkpoint_file=None):
     return cmd
 
 
-def _mdrun_str(op_name, nt=None, verbose=False):
-    """Helper function, returns mdrun command string for operation."""
+def _mdrun_str(op_name, nt=None, verbose=False, walltime=None):
+    """Helper function, returns mdrun command string for operation.
+
+    The run continues from the checkpoint file if it exists. If a walltime
+    in hours is given, mdrun stops in time to write a final checkpoint.
+    """
     num_threads = 1 if nt is None else nt
-    cmd = ("{gmx} mdrun -ntomp {num_threads} {verbose} -deffnm {op}").format(
+    cmd = (
+        "{gmx} mdrun -ntomp {num_threads} {verbose} -deffnm {op} -cpi {op}.cpt {maxh}"
+    ).format(
         gmx=gmx_exec,
         num_threads=num_threads,
         op=op_name,
         verbose="-v" if verbose else "",
+        maxh="" if walltime is None else f"-maxh {walltime * walltime_fraction:g}",
     )
     return cmd
 
 
+def _read_mdrun_progress(log_file):
+    """Helper function, returns the last and the total number of steps in a log file."""
+    step = nsteps = None
+    with open(log_file) as log:
+        lines = iter(log)
+        for line in lines:
+            if line.split() == ["Step", "Time"]:
+                step = int(next(lines).split()[0])
+            elif line.split()[:2] == ["nsteps", "="]:
+                nsteps = int(line.split()[2])
+    return step, nsteps
+
+
+def _store_mdrun_progress(operation_name, job):
+    """Hook function, stores the progress of the production run in the job document.
+
+    The run is only finished when the last step has been reached, since mdrun
+    also writes the final configuration when it stops early due to -maxh.
+    """
+    if job.isfile(production_log):
+        step, nsteps = _read_mdrun_progress(job.fn(production_log))
+        job.doc.progress = {
+            "step": step,
+            "nsteps": nsteps,
+            "checkpoint": job.isfile(production_checkpoint),
+        }
+
+
 # First three steps are simple configuration
-@MyProject.post.isfile(gro_file)
+@prepare
+@MyProject.post(_isfile(gro_file))
 @MyProject.operation(cmd=True, with_job=True)
 def pdb2gmx(job):
     return (
@@ -111,8 +245,9 @@ def pdb2gmx(job):
     )
 
 
+@prepare
 @MyProject.pre.after(pdb2gmx)
-@MyProject.post.isfile(boxed_file)
+@MyProject.post(_isfile(boxed_file))
 @MyProject.operation(cmd=True, with_job=True)
 def editconf(job):
     return (
@@ -127,8 +262,9 @@ def editconf(job):
     )
 
 
-@MyProject.pre.isfile(boxed_file)
-@MyProject.post.isfile(solvated_file)
+@prepare
+@MyProject.pre(_isfile(boxed_file))
+@MyProject.post(_isfile(solvated_file))
 @MyProject.operation(cmd=True, with_job=True)
 def solvate(job):
     return (
@@ -149,26 +285,31 @@ def solvate(job):
 # have to make sure that the topology has the correct
 # interaction parameters so that the resulting topology
 # will accurately model water molecules
-# The grompp here is split because the ionization uses a
-# python operation to leverage the pexpect class to
-# automate responding to requested std input
+# The grompp here is split from the ionization so that each
+# step has its own post-condition.
 
 
-@MyProject.pre.isfile(solvated_file)
-@MyProject.post.isfile(ionization_config)
+@prepare
+@MyProject.pre(_isfile(solvated_file))
+@MyProject.post(_isfile(ionization_config))
 @MyProject.operation(cmd=True, with_job=True)
 def grompp_add_ions(job):
     return _grompp_str("ions", solvated_file).format(job)
 
 
+# genion interactively asks for the group of solvent molecules to replace
+# with ions. Piping the group name to its standard input makes the
+# ionization a regular command operation, which can be bundled and
+# executed in parallel like all other preparation steps.
+@prepare
 @MyProject.pre.after(grompp_add_ions)
 @MyProject.post(prepared_for_simulation)
-@MyProject.operation(with_job=True)
+@MyProject.operation(cmd=True, with_job=True)
 def ionize(job):
-    """Exploit the pexpect module to run."""
-    cmd = (
-        "{gmx} genion -s {io_config} -o {ionized_gro} "
+    return (
+        "echo {group} | {gmx} genion -s {io_config} -o {ionized_gro} "
         "-p -pname {pname} -nname {nname} -neutral".format(
+            group=solvent_group,
             gmx=gmx_exec,
             io_config=ionization_config,
             ionized_gro=ionized_file,
@@ -176,25 +317,18 @@ def ionize(job):
             nname=nname,
         )
     )
-    child = pexpect.spawn(cmd)
-    child.expect("Select a group:*")
-    child.send("13\n")
-    print(child.before.decode("ascii"))
-    print(child.after.decode("ascii"))
-    child.expect(pexpect.EOF)
-    print(child.before.decode("ascii"))
 
 
 # Minimization
 @MyProject.pre(prepared_for_simulation)
-@MyProject.post.isfile(em_op + ".tpr")
+@MyProject.post(_isfile(em_op + ".tpr"))
 @MyProject.operation(cmd=True, with_job=True)
 def grompp_minim(job):
     return _grompp_str("minim", ionized_file).format(job)
 
 
 @MyProject.pre.after(grompp_minim)
-@MyProject.post.isfile(em_file)
+@MyProject.post(_isfile(em_file))
 @MyProject.operation(cmd=True, with_job=True)
 def minim(job):
     return _mdrun_str("minim").format(job)
@@ -202,49 +336,63 @@ def minim(job):
 
 # Equilibration: NVT then NPT
 @MyProject.pre.after(minim)
-@MyProject.post.isfile(nvt_op + ".tpr")
+@MyProject.post(_isfile(nvt_op + ".tpr"))
 @MyProject.operation(cmd=True, with_job=True)
 def grompp_nvt(job):
     return _grompp_str("nvt", em_file).format(job)
 
 
 @MyProject.pre.after(grompp_nvt)
-@MyProject.post.isfile(nvt_file)
+@MyProject.post(_isfile(nvt_file))
 @MyProject.operation(cmd=True, directives={"np": 16}, with_job=True)
 def nvt(job):
     return _mdrun_str("nvt").format(job)
 
 
 @MyProject.pre.after(nvt)
-@MyProject.post.isfile(npt_op + ".tpr")
+@MyProject.post(_isfile(npt_op + ".tpr"))
 @MyProject.operation(cmd=True, with_job=True)
 def grompp_npt(job):
     return _grompp_str("npt", nvt_file).format(job)
 
 
-@MyProject.pre.isfile(npt_op + ".tpr")
-@MyProject.post.isfile(npt_file)
+@MyProject.pre(_isfile(npt_op + ".tpr"))
+@MyProject.post(_isfile(npt_file))
 @MyProject.operation(cmd=True, directives={"np": 16}, with_job=True)
 def npt(job):
     return _mdrun_str("npt").format(job)
 
 
 # Final run
-@MyProject.pre.isfile(npt_file)
-@MyProject.post.isfile(production_op + ".tpr")
+@MyProject.pre(_isfile(npt_file))
+@MyProject.post(_isfile(production_op + ".tpr"))
 @MyProject.operation(cmd=True, with_job=True)
 def grompp_md(job):
     return _grompp_str("md", npt_file).format(job)
 
 
+# The production run is resubmitted until it has finished, continuing from
+# the last checkpoint each time.
 @MyProject.pre.after(grompp_md)
 @MyProject.post(finished)
+@MyProject.operation_hooks.on_exit(_store_mdrun_progress)
 @MyProject.operation(
-    cmd=True, directives={"nranks": 4, "omp_num_threads": 4}, with_job=True
+    cmd=True,
+    directives={
+        "nranks": 4,
+        "omp_num_threads": 4,
+        "walltime": production_walltime,
+    },
+    with_job=True,
 )
 def md(job):
-    return _mdrun_str("md", nt=4).format(job)
+    return _mdrun_str("md", nt=4, walltime=production_walltime).format(job)
 
 
 if __name__ == "__main__":
-    MyProject().main()
+    project = MyProject()
+    project.project_hooks.on_start.append(_start_timer)
+    project.project_hooks.on_success.append(_record_timing)
+    _file_index.enabled = _command(sys.argv[1:]) in READ_ONLY_COMMANDS
+    project.main()
+    logger.debug(f"File index: {_file_index.hits} hits, {_file_index.misses} misses.")
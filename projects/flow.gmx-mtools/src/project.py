@@ -1,11 +1,17 @@
 """Define the project's workflow logic."""
 
+import logging
+import os
+import sys
+
 import mbuild as mb
 import signac
 from flow import FlowProject
 
 project_path = signac.get_project().path
 
+logger = logging.getLogger(__name__)
+
 
 def _grompp_str(path, op_name, gro_name, sys_name):
     """Helper function, returns grompp command string for operation"""
@@ -29,28 +35,76 @@ def gromacs_command(name, gro, sys):
     )
 
 
+class _FileIndex:
+    """Snapshot of the files in each job directory.
+
+    Every label and file condition would otherwise stat its file once per job
+    and status query, which is slow on network file systems. Instead, each
+    job directory is listed once and all conditions are answered from that
+    listing. Operations may run in other processes, e.g. with
+    `run --parallel`, so the listings are only used by commands that do not
+    execute operations; otherwise each condition checks the file directly.
+
+    The flow.gmx-lysozyme-in-water and flow.gmx-mtools examples define the
+    same class, so that each example can be copied on its own.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+
+    def isfile(self, job, filename):
+        if not self.enabled:
+            return os.path.isfile(job.fn(filename))
+        try:
+            files = self._files[job.id]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            try:
+                with os.scandir(job.path) as entries:
+                    files = {entry.name for entry in entries if entry.is_file()}
+            except FileNotFoundError:
+                files = set()
+            self._files[job.id] = files
+        return filename in files
+
+
+_file_index = _FileIndex()
+
+# Commands that evaluate the conditions without executing any operations.
+READ_ONLY_COMMANDS = ("status", "next", "submit")
+
+
+def _command(argv):
+    """Returns the subcommand of the command line, e.g. 'status'."""
+    return next((arg for arg in argv if not arg.startswith("-")), None)
+
+
 class MyProject(FlowProject):
     pass
 
 
 @MyProject.label
 def initialized(job):
-    return job.isfile("init.top")
+    return _file_index.isfile(job, "init.top")
 
 
 @MyProject.label
 def minimized(job):
-    return job.isfile("em.gro")
+    return _file_index.isfile(job, "em.gro")
 
 
 @MyProject.label
 def equilibrated(job):
-    return job.isfile("equil.gro")
+    return _file_index.isfile(job, "equil.gro")
 
 
 @MyProject.label
 def sampled(job):
-    return job.isfile("sample.gro")
+    return _file_index.isfile(job, "sample.gro")
 
 
 @MyProject.post(initialized)
@@ -88,4 +142,7 @@ def sample(job):
 
 
 if __name__ == "__main__":
-    MyProject.get_project(project_path).main()
+    project = MyProject.get_project(project_path)
+    _file_index.enabled = _command(sys.argv[1:]) in READ_ONLY_COMMANDS
+    project.main()
+    logger.debug(f"File index: {_file_index.hits} hits, {_file_index.misses} misses.")
@@ -6,13 +6,51 @@ status, execute operations and submit them to a cluster. See also:
     $ python src/project.py --help
 """
 
-from flow import FlowProject
+import hashlib
+import json
+import os
+import shutil
+from datetime import timedelta
+
+import numpy as np
+import signac
+from flow import FlowProject, aggregator
+
+# Number of time steps between updates of the sampling progress.
+SAMPLE_CHUNK_STEPS = 1000
+
+# Requested walltime for jobs without a measured performance.
+DEFAULT_WALLTIME = timedelta(hours=1)
+
+# Set SAMPLE_SWEEP to initialize and sample the jobs with sample_sweep
+# instead of with initialize and sample. Only one of the two is eligible, so
+# that the same job is never simulated by both at the same time.
+SAMPLE_SWEEP = False
+
+# Number of state points simulated one after another by sample_sweep.
+SWEEP_SIZE = 5
+
+# Lattice constant of the initial simple cubic lattice.
+LATTICE_CONSTANT = 1.0
 
 
 class MyProject(FlowProject):
     pass
 
 
+def estimate_walltime(job):
+    """Estimate the walltime required to finish sampling a job.
+
+    The estimate is based on the time steps per second measured in
+    previous executions and includes a safety margin of 20%.
+    """
+    tps = job.document.get("tps")
+    if not tps:
+        return DEFAULT_WALLTIME
+    remaining_steps = job.doc.run_steps - job.document.get("sample_step", 0)
+    return timedelta(seconds=max(1.2 * remaining_steps / tps, 60))
+
+
 # Definition of project-related labels (classification)
 @MyProject.label
 def estimated(job):
@@ -29,7 +67,25 @@ def sampled(job):
     return job.document.get("sample_step", 0) >= job.doc.run_steps
 
 
+@MyProject.label
+def analyzed(job):
+    return "density" in job.document
+
+
+def lattice_filename(job):
+    """Return the project-level path of the initial configuration of a job.
+
+    The initial lattice only depends on the number of particles, so all
+    jobs with the same lattice parameters share one file, named by the
+    hash of these parameters.
+    """
+    parameters = {"N": job.sp.N, "a": LATTICE_CONSTANT}
+    key = hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+    return job.project.fn(os.path.join("lattices", f"{key}.gsd"))
+
+
 # Adding project operations
+@MyProject.pre(lambda job: not SAMPLE_SWEEP)
 @MyProject.post.isfile("init.gsd")
 @MyProject.operation
 def initialize(job):
@@ -38,23 +94,47 @@ def initialize(job):
 
     import hoomd
 
-    if hoomd.context.exec_conf is None:
-        hoomd.context.initialize("")
-    with job:
+    filename = lattice_filename(job)
+    if not os.path.isfile(filename):
+        if hoomd.context.exec_conf is None:
+            hoomd.context.initialize("")
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # write to a temporary file first, since other processes may
+        # create the same lattice at the same time
+        tmp_filename = f"{filename}.{os.getpid()}.gsd"
         with hoomd.context.SimulationContext():
             # create a simple cubic lattice
             n = int(ceil(pow(job.sp.N, 1.0 / 3)))
             assert n**3 == job.sp.N
-            hoomd.init.create_lattice(unitcell=hoomd.lattice.sc(a=1.0), n=n)
-            hoomd.dump.gsd("init.gsd", period=None, group=hoomd.group.all())
+            hoomd.init.create_lattice(
+                unitcell=hoomd.lattice.sc(a=LATTICE_CONSTANT), n=n
+            )
+            hoomd.dump.gsd(tmp_filename, period=None, group=hoomd.group.all())
+        os.replace(tmp_filename, filename)
+    # link the shared configuration into the job, copy it if linking fails
+    try:
+        os.link(filename, job.fn("init.gsd"))
+    except FileExistsError:
+        # the configuration was already linked or copied into the job
+        pass
+    except OSError:
+        # e.g. the workspace is on a different file system
+        shutil.copyfile(filename, job.fn("init.gsd"))
 
 
+@MyProject.pre(lambda job: not SAMPLE_SWEEP)
 @MyProject.pre.isfile("init.gsd")
 @MyProject.post(sampled)
-@MyProject.operation
+@MyProject.operation(directives={"walltime": estimate_walltime})
 def sample(job):
-    "Sample operation."
+    """Sample operation.
+
+    The progress and the performance are stored in the job document after
+    every chunk of time steps, so that interrupted jobs can be restarted
+    and scheduled according to their remaining work.
+    """
     import logging
+    import time
 
     import hoomd
     from hoomd import md
@@ -76,7 +156,16 @@ def sample(job):
             )
             hoomd.analyze.log("dump.log", ["volume"], 100, phase=0)
             try:
-                hoomd.run_upto(job.doc.run_steps)
+                while hoomd.get_step() < job.doc.run_steps:
+                    start_step = hoomd.get_step()
+                    start_time = time.time()
+                    hoomd.run_upto(
+                        min(start_step + SAMPLE_CHUNK_STEPS, job.doc.run_steps)
+                    )
+                    elapsed = time.time() - start_time
+                    gsd_restart.write_restart()
+                    job.document["sample_step"] = hoomd.get_step()
+                    job.document["tps"] = (hoomd.get_step() - start_step) / elapsed
             except hoomd.WalltimeLimitReached:
                 logging.warning("Reached walltime limit.")
             finally:
@@ -84,6 +173,128 @@ def sample(job):
                 job.document["sample_step"] = hoomd.get_step()
 
 
+@MyProject.pre(lambda *jobs: SAMPLE_SWEEP)
+@MyProject.post(lambda *jobs: all(sampled(job) for job in jobs))
+@MyProject.operation(
+    aggregator=aggregator.groupsof(SWEEP_SIZE, sort_by="p"),
+    directives={
+        "walltime": lambda *jobs: sum(map(estimate_walltime, jobs), timedelta())
+    },
+)
+def sample_sweep(*jobs):
+    """Initialize and sample several state points in a single process.
+
+    For small systems, setting up HOOMD-blue is a large fraction of the
+    runtime. Here, the execution context is initialized only once for all
+    jobs of the aggregate. The output of each job is the same as with the
+    initialize and sample operations.
+    """
+    for job in jobs:
+        if not job.isfile("init.gsd"):
+            initialize(job)
+        if not sampled(job):
+            sample(job)
+
+
+def statistical_inefficiency(x):
+    """Return the statistical inefficiency of the time series x.
+
+    The autocorrelation function is computed with FFTs and integrated up to
+    its first non-positive value.
+    """
+    n = len(x)
+    dx = x - x.mean()
+    variance = dx.var()
+    if variance == 0:
+        return 1.0
+    transform = np.fft.rfft(dx, 2 * n)
+    acf = np.fft.irfft(transform * np.conj(transform))[1:n]
+    acf /= variance * np.arange(n - 1, 0, -1)
+    t = np.arange(1, n)
+    cutoff = np.argmax(acf <= 0) if np.any(acf <= 0) else n - 1
+    g = 1 + 2 * np.sum((1 - t[:cutoff] / n) * acf[:cutoff])
+    return max(float(g), 1.0)
+
+
+def detect_equilibration(x, num_origins=20):
+    """Detect the start of the equilibrated region of the time series x.
+
+    The start index is chosen to maximize the number of uncorrelated samples
+    after it. Returns the start index, the statistical inefficiency, and the
+    number of uncorrelated samples.
+    """
+    best = (0, 1.0, 0.0)
+    for t0 in np.unique(np.linspace(0, len(x) // 2, num_origins, dtype=int)):
+        g = statistical_inefficiency(x[t0:])
+        num_samples = (len(x) - t0) / g
+        if num_samples > best[2]:
+            best = (int(t0), g, num_samples)
+    return best
+
+
+@MyProject.pre(sampled)
+@MyProject.post(analyzed)
+@MyProject.operation
+def analyze(job):
+    "Compute the mean density and its error from the equilibrated samples."
+    data = np.genfromtxt(job.fn("dump.log"), names=True)
+    # remove repeated headers
+    data = data[np.isfinite(data["timestep"])]
+    # Time steps logged again after a restart are kept from the continued
+    # run, i.e. the last occurrence of each time step.
+    last = len(data) - 1 - np.unique(data["timestep"][::-1], return_index=True)[1]
+    data = data[last]
+    density = job.sp.N / data["volume"]
+    t0, g, num_samples = detect_equilibration(density)
+    job.document["equilibration_step"] = int(data["timestep"][t0])
+    job.document["statistical_inefficiency"] = g
+    job.document["density"] = float(density[t0:].mean())
+    job.document["density_error"] = float(
+        density[t0:].std(ddof=1) / np.sqrt(num_samples)
+    )
+
+
+def equation_of_state_table(jobs):
+    "Return the pressures and the simulated and ideal-gas densities of the jobs."
+    return np.array(
+        [
+            (
+                job.sp.p,
+                job.doc.density,
+                job.doc.density_error,
+                job.sp.N / job.doc.volume_estimate,
+            )
+            for job in jobs
+        ]
+    )
+
+
+def equation_of_state_written(*jobs):
+    """Check that eos.txt contains the current results of exactly these jobs.
+
+    The file is rewritten when jobs are added or removed, or when a job is
+    analyzed again."""
+    filename = jobs[0].project.fn("eos.txt")
+    if not os.path.isfile(filename):
+        return False
+    if not all(analyzed(job) and estimated(job) for job in jobs):
+        return False
+    # savetxt writes the floats with enough digits to read them back exactly
+    return np.array_equal(np.loadtxt(filename, ndmin=2), equation_of_state_table(jobs))
+
+
+@MyProject.pre(lambda *jobs: all(analyzed(job) and estimated(job) for job in jobs))
+@MyProject.post(equation_of_state_written)
+@MyProject.operation(aggregator=aggregator(sort_by="p"))
+def equation_of_state(*jobs):
+    "Write the simulated and the ideal-gas densities of all pressures to eos.txt."
+    np.savetxt(
+        jobs[0].project.fn("eos.txt"),
+        equation_of_state_table(jobs),
+        header="p density density_error ideal_gas_density",
+    )
+
+
 @MyProject.post(estimated)
 @MyProject.operation
 def estimate(job):
@@ -94,5 +305,18 @@ def estimate(job):
     job.document["volume_estimate"] = V
 
 
+@MyProject.post(lambda *jobs: all(estimated(job) for job in jobs))
+@MyProject.operation(aggregator=aggregator())
+def estimate_all(*jobs):
+    "Ideal-gas estimate operation for all jobs at once."
+    # Gather the state points into arrays and calculate all volumes at once
+    N, kT, p = np.array([(job.sp.N, job.sp.kT, job.sp.p) for job in jobs]).T
+    V = N * kT / p
+    # Write all documents when leaving the buffered context
+    with signac.buffered():
+        for job, volume in zip(jobs, V):
+            job.document["volume_estimate"] = float(volume)
+
+
 if __name__ == "__main__":
     MyProject().main()
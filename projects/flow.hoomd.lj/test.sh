@@ -3,5 +3,7 @@ python src/project.py status -d -p 1
 python src/project.py run -o initialize --progress
 python src/project.py run -o estimate --progress
 python src/project.py run -o sample --progress
+python src/project.py run -o analyze --progress
+python src/project.py run -o equation_of_state
 python src/project.py status -d
 python -m jupyter nbconvert --to html --execute src/notebook.ipynb
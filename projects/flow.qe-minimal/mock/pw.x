@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Mock of the Quantum Espresso pw.x binary for testing the workflow.
+
+Reads an input file from standard input and prints the lines of the pw.x
+output that project.py parses. The total energy converges with the cutoff
+like 50 / ecut**2. Like pw.x, the output directories are created without
+their parent directories.
+"""
+
+import os
+import re
+import sys
+
+text = sys.stdin.read()
+settings = dict(re.findall(r"^\s*(\w+)\s*=\s*'?([^'\n]*)'?\s*$", text, re.MULTILINE))
+ecut = float(settings["ecutwfc"])
+for directory in (settings["outdir"], settings["wfcdir"]):
+    try:
+        os.mkdir(directory)
+    except FileExistsError:
+        pass
+    except OSError:
+        sys.exit(f"Error: unable to create directory {directory}")
+with open(os.path.join(settings["wfcdir"], settings["prefix"] + ".wfc1"), "w"):
+    pass
+
+num_ionic_steps = 2 if settings["calculation"] == "vc-relax" else 1
+for step in range(num_ionic_steps):
+    for iteration in range(1, 6):
+        print(
+            f"     iteration #  {iteration}     ecut=    {ecut:.2f} Ry     beta= 0.70"
+        )
+        print(
+            f"     total cpu time spent up to now is        {0.1 * iteration:.1f} secs"
+        )
+    energy = -15.85 + 50 / ecut**2 - 1e-4 * step
+    print(f"!    total energy              =     {energy:.8f} Ry")
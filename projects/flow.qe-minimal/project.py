@@ -1,12 +1,41 @@
 import os
+import shlex
+import string
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-import signac
 from flow import FlowProject
 
 # Make sure to update the path to your Quantum Espresso installation!
 PWX = "pw.x"
 
+# Candidate plane-wave cutoffs (in Ry) for the convergence scan.
+ECUT_VALUES = [40, 60, 80, 100, 150, 200, 250, 300, 400, 500]
+
+# The cutoff is converged when the total energy changes by less than this
+# tolerance (in Ry) when going to the next higher cutoff.
+ECUT_TOLERANCE = 1e-3
+
+# Number of pw.x runs that are executed concurrently during the scan.
+NUM_WORKERS = 4
+
+# Runs are killed when a single SCF cycle needs more iterations than this.
+MAX_SCF_ITERATIONS = 50
+
+# The placeholders that the input file template must provide.
+TEMPLATE_FIELDS = {
+    "prefix",
+    "method",
+    "outdir",
+    "wfcdir",
+    "pseudo_dir",
+    "lattice_parameter",
+    "number_of_bands",
+    "potential",
+    "ecut",
+}
+
 
 class Project(FlowProject):
     pass
@@ -22,45 +51,159 @@ def calculated(job):
     return "final_energy" in job.document
 
 
-def create_infile(job, method, ecut):
-    project = signac.get_project()
-    with open(project.fn("vc-relax.in")) as template:
-        with open(job.fn(f"{method}.in"), "w") as infile:
-            infile.write(
-                template.read().format(
-                    prefix="calc",
-                    wfcdir=job.fn("wcf"),
-                    lattice_parameter=job.sp.lattice_parameter,
-                    number_of_bands=job.sp.number_of_bands,
-                    outdir=job.fn("out"),
-                    pseudo_dir=os.path.join(project.path, "pseudo"),
-                    method=method,
-                    potential=job.sp.potential,
-                    ecut=ecut,
-                )
+@lru_cache(maxsize=None)
+def load_template(filename):
+    """Read the input file template only once per process.
+
+    Raises a ValueError if the placeholders of the template do not match
+    TEMPLATE_FIELDS, before any input file is written.
+    """
+    with open(filename) as template:
+        text = template.read()
+    fields = {field for _, field, _, _ in string.Formatter().parse(text) if field}
+    if fields != TEMPLATE_FIELDS:
+        raise ValueError(
+            f"The placeholders {sorted(fields ^ TEMPLATE_FIELDS)} of the template "
+            f"'{filename}' do not match the expected placeholders."
+        )
+    return text
+
+
+def create_infile(job, method, ecut, name=None):
+    """Write the input file for method and return its path.
+
+    Each name gets its own output and wavefunction directories, so that runs
+    with different names can be executed at the same time.
+    """
+    name = method if name is None else name
+    template = load_template(job.project.fn("vc-relax.in"))
+    # pw.x does not create missing parent directories.
+    outdir = job.fn(os.path.join("out", name))
+    wfcdir = job.fn(os.path.join("wcf", name))
+    os.makedirs(outdir, exist_ok=True)
+    os.makedirs(wfcdir, exist_ok=True)
+    with open(job.fn(f"{name}.in"), "w") as infile:
+        infile.write(
+            template.format(
+                prefix="calc",
+                wfcdir=wfcdir,
+                lattice_parameter=job.sp.lattice_parameter,
+                number_of_bands=job.sp.number_of_bands,
+                outdir=outdir,
+                pseudo_dir=job.project.fn("pseudo"),
+                method=method,
+                potential=job.sp.potential,
+                ecut=ecut,
             )
+        )
     return infile.name
 
 
+def create_infiles(jobs, method, ecuts):
+    """Write the input files of method for all jobs and cutoffs at once.
+
+    Returns a dict mapping each pair of job id and cutoff to the path of
+    its input file.
+    """
+    return {
+        (job.id, ecut): create_infile(job, method, ecut, name=f"{method}-ecut{ecut}")
+        for job in jobs
+        for ecut in ecuts
+    }
+
+
+def run_pwx(infile, outfile):
+    """Run pw.x and parse its output while it is running.
+
+    The output is written to outfile. Returns the total energy (in Ry),
+    the number of SCF iterations, and the cpu time (in s) of each ionic
+    step. The run is killed as soon as an SCF cycle exceeds
+    MAX_SCF_ITERATIONS, since it is unlikely to converge. The run failed if
+    pw.x exited with a non-zero status without being killed.
+    """
+    run = {
+        "energies": [],
+        "scf_iterations": [],
+        "cpu_times": [],
+        "killed": False,
+        "failed": False,
+    }
+    iterations = 0
+    cpu_time = None
+    with open(infile) as stdin, open(outfile, "w") as stdout:
+        with subprocess.Popen(
+            shlex.split(PWX), stdin=stdin, stdout=subprocess.PIPE, text=True
+        ) as process:
+            for line in process.stdout:
+                stdout.write(line)
+                if line.startswith("!"):
+                    run["energies"].append(float(line.split("=")[1].split()[0]))
+                    run["scf_iterations"].append(iterations)
+                    run["cpu_times"].append(cpu_time)
+                    iterations = 0
+                elif line.lstrip().startswith("iteration #"):
+                    iterations += 1
+                    if iterations > MAX_SCF_ITERATIONS:
+                        process.kill()
+                        run["killed"] = True
+                        break
+                elif line.lstrip().startswith("total cpu time spent up to now is"):
+                    cpu_time = float(line.split()[-2])
+    run["failed"] = process.returncode != 0 and not run["killed"]
+    return run
+
+
+def total_energy(run):
+    """Return the final total energy of a run, or None if it did not converge."""
+    if run["killed"] or run["failed"] or not run["energies"]:
+        return None
+    return run["energies"][-1]
+
+
+def find_converged_ecut(energies):
+    """Return the lowest cutoff whose energy agrees with the next cutoff.
+
+    Returns None if no pair of consecutive cutoffs agrees within the
+    tolerance yet.
+    """
+    for ecut, next_ecut in zip(ECUT_VALUES, ECUT_VALUES[1:]):
+        energy = energies.get(ecut)
+        next_energy = energies.get(next_ecut)
+        if energy is None or next_energy is None:
+            continue
+        if abs(next_energy - energy) < ECUT_TOLERANCE:
+            return ecut
+
+
 @Project.post(converged)
 @Project.operation
 def vc_relax(job):
-    converged = False
-    for e_cut in [160, 40, 60, 80, 100, 150, 200, 250, 300, 400, 500]:
-        print(f"Attempting ecut={e_cut}")
-        infile = create_infile(job, "vc-relax", e_cut)
-        cmd = "{} < {} > {}".format(PWX, infile, job.fn("vc-relax.out"))
-        subprocess.check_call(cmd, shell=True)
-        with open(job.fn("vc-relax.out")) as outfile:
-            for line in outfile:
-                if line.startwith("!"):
-                    converged = True
-                    break
-        if converged:
-            job.document["ecut"] = e_cut
-            break
-    else:
-        raise RuntimeError("Did not converge for ecut values!")
+    # The cutoffs are evaluated in batches of concurrent runs, from low to
+    # high. The scan stops after the first batch that yields a converged
+    # cutoff. The input files of a batch are only written when it runs, and
+    # every run writes to its own output file.
+    runs = {}
+    energies = {}
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        for i in range(0, len(ECUT_VALUES), NUM_WORKERS):
+            batch = ECUT_VALUES[i:][:NUM_WORKERS]
+            print(f"Attempting ecut={batch}")
+            infiles = create_infiles([job], "vc-relax", batch)
+            results = executor.map(
+                run_pwx,
+                [infiles[job.id, e_cut] for e_cut in batch],
+                [job.fn(f"vc-relax-ecut{e_cut}.out") for e_cut in batch],
+            )
+            for e_cut, run in zip(batch, results):
+                runs[str(e_cut)] = run
+                energies[e_cut] = total_energy(run)
+            job.document["ecut_runs"] = runs
+            e_cut = find_converged_ecut(energies)
+            if e_cut is not None:
+                job.document["ecut"] = e_cut
+                break
+        else:
+            raise RuntimeError("Did not converge for ecut values!")
 
 
 @Project.pre(converged)
@@ -69,9 +212,10 @@ def vc_relax(job):
 def scf(job):
     infile = create_infile(job, "scf", job.document["ecut"])
     print(job.fn("scf.out"))
-    subprocess.check_call(
-        "{} < {} > {}".format(PWX, infile, job.fn("scf.out")), shell=True
-    )
+    run = run_pwx(infile, job.fn("scf.out"))
+    if total_energy(run) is None:
+        raise RuntimeError("The SCF calculation did not converge!")
+    job.document["final_energy"] = total_energy(run)
 
 
 if __name__ == "__main__":
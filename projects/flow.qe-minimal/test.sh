@@ -0,0 +1,4 @@
+python init.py
+PATH="$PWD/mock:$PATH" python project.py run -o vc_relax
+PATH="$PWD/mock:$PATH" python project.py run -o scf
+python project.py status --detailed
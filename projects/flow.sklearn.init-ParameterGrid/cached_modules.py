@@ -0,0 +1,210 @@
+"""Dashboard modules that cache their cards and display image thumbnails.
+
+The cards of the cached modules are rendered once and reused until the
+underlying file of the job changes, so that page views do not read every
+job document again. Least recently used cards are evicted once a cache is
+full.
+
+The flow.2D-random-walk and flow.sklearn.init-ParameterGrid examples use
+identical copies of this module, so that each example can be copied on its
+own.
+"""
+
+import glob
+import itertools
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import flask_login
+import matplotlib.image
+from flask import render_template_string, send_from_directory, url_for
+from signac_dashboard.modules import (
+    DocumentList,
+    ImageViewer,
+    StatepointList,
+    TextDisplay,
+)
+
+# Thumbnails are stored in this directory of the project, not in the jobs.
+THUMBNAIL_DIR = ".dashboard_thumbnails"
+THUMBNAIL_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Same as the card of the ImageViewer module, but shows the thumbnail on the
+# card and the full image in the modal.
+THUMBNAIL_TEMPLATE = """
+<div class="image">
+  <span class="modal-button" data-target="modal-{{ modal_label }}-{{ filename }}">
+    <img src="{{ thumbnail_url }}"
+         alt="{{ filename }}" title="{{ filename }}" loading="lazy" />
+  </span>
+</div>
+<div id="modal-{{ modal_label }}-{{ filename }}" class="modal modal-fx-fadeInScale">
+  <div class="modal-background"></div>
+  <div class="modal-content is-image is-huge">
+    <img src="{{ url_for('get_file', jobid=jobid, filename=filename) }}"
+         alt="{{ filename }}" title="{{ filename }}" />
+  </div>
+  <button class="modal-close is-large" aria-label="close"></button>
+</div>
+"""
+
+
+class MtimeCache:
+    """Least recently used cache of values derived from files.
+
+    A cached value is recomputed when the modification time of its file
+    changes.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename, compute):
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            entry = self._data.get(filename)
+            if entry is not None and entry[0] == mtime:
+                self._data.move_to_end(filename)
+                return entry[1]
+        value = compute()
+        with self._lock:
+            self._data[filename] = (mtime, value)
+            self._data.move_to_end(filename)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+
+class CachedCardsMixin(ABC):
+    """Cache the cards of a module until the file returned by cache_file changes."""
+
+    def __init__(self, *args, maxsize=1024, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = MtimeCache(maxsize)
+
+    @abstractmethod
+    def cache_file(self, job_or_project):
+        """Return the file whose changes invalidate the cards of job_or_project."""
+
+    def get_cards(self, job_or_project):
+        get_cards = super().get_cards
+        return self._cache.get(
+            self.cache_file(job_or_project), lambda: list(get_cards(job_or_project))
+        )
+
+
+class CachedDocumentList(CachedCardsMixin, DocumentList):
+    """Displays the job or project document, cached until the document changes."""
+
+    def cache_file(self, job_or_project):
+        return job_or_project.document.filename
+
+
+class CachedStatepointList(CachedCardsMixin, StatepointList):
+    """Displays the job state point, cached until the state point file changes."""
+
+    def cache_file(self, job):
+        return job.fn("signac_statepoint.json")
+
+
+class CachedTextDisplay(CachedCardsMixin, TextDisplay):
+    """Displays a message derived from the job or project document.
+
+    The message is cached until the document changes, so it must only
+    depend on the document and the state point.
+    """
+
+    def cache_file(self, job_or_project):
+        return job_or_project.document.filename
+
+
+class ThumbnailViewer(ImageViewer):
+    """Displays downscaled thumbnails of images, which open the full image.
+
+    Thumbnails of PNG and JPEG images are stored in the THUMBNAIL_DIR
+    directory of the project, so that the job directories are not modified,
+    and recreated when the image changes. If precompute is True, the
+    thumbnails of all jobs are created when the dashboard starts. Other image
+    types are displayed in full size.
+    """
+
+    def __init__(self, name="Image Viewer", scale=0.25, precompute=True, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.scale = scale
+        self.precompute = precompute
+
+    def register(self, dashboard):
+        root = self._root = dashboard.project.fn(THUMBNAIL_DIR)
+
+        # Several viewers share the route, which can only be registered once.
+        if "thumbnail_viewer" not in dashboard.app.view_functions:
+
+            @dashboard.app.route("/module/thumbnail_viewer/<path:filename>")
+            @flask_login.login_required
+            def thumbnail_viewer(filename):
+                return send_from_directory(root, filename, max_age=0)
+
+        if self.precompute and self.context == "JobContext":
+            for job in dashboard.project:
+                for filepath in self._image_files(job):
+                    self._thumbnail(job, filepath)
+
+    def _image_files(self, job_or_project):
+        image_globs = [
+            glob.iglob(job_or_project.fn(image_glob)) for image_glob in self.img_globs
+        ]
+        return sorted(itertools.chain(*image_globs), key=self.sort_key)
+
+    def _thumbnail(self, job_or_project, filepath):
+        """Return the path of the thumbnail relative to THUMBNAIL_DIR.
+
+        The thumbnail is created if it is outdated. Returns None for images
+        without thumbnails.
+        """
+        if not filepath.lower().endswith(THUMBNAIL_EXTENSIONS):
+            return None
+        owner = job_or_project.id if self.context == "JobContext" else "project"
+        thumbnail = os.path.join(
+            owner, os.path.relpath(filepath, job_or_project.fn(""))
+        )
+        path = os.path.join(self._root, thumbnail)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(filepath):
+                return thumbnail
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        matplotlib.image.thumbnail(filepath, path, scale=self.scale)
+        return thumbnail
+
+    def get_cards(self, job_or_project):
+        if self.context == "JobContext":
+            jobid = modal_label = job_or_project.id
+        else:
+            jobid = None
+            modal_label = "project"
+        root = job_or_project.fn("")
+        for filepath in self._image_files(job_or_project):
+            filename = os.path.relpath(filepath, root)
+            thumbnail = self._thumbnail(job_or_project, filepath)
+            if thumbnail is None:
+                thumbnail_url = url_for("get_file", jobid=jobid, filename=filename)
+            else:
+                thumbnail_url = url_for("thumbnail_viewer", filename=thumbnail)
+            yield {
+                "name": self.name + ": " + filename,
+                "content": render_template_string(
+                    THUMBNAIL_TEMPLATE,
+                    modal_label=modal_label,
+                    jobid=jobid,
+                    filename=filename,
+                    thumbnail_url=thumbnail_url,
+                ),
+            }
@@ -1,21 +1,133 @@
 #!/usr/bin/env python3
+import os
+import time
+
+import signac
+from cached_modules import CachedStatepointList, CachedTextDisplay, ThumbnailViewer
 from signac_dashboard import Dashboard
-from signac_dashboard.modules import ImageViewer, StatepointList, TextDisplay
+from signac_dashboard.modules import TextDisplay
+
+# Only models with at least this testing accuracy are listed as best models.
+MIN_SCORE = 0.95
+
+# Minimum time in seconds between two checks for modified job documents.
+REFRESH_INTERVAL = 5
+
+
+class JobIndex:
+    """Titles and testing accuracies of all jobs.
+
+    The index is built once when the dashboard starts, so that showing and
+    sorting jobs does not read their state points and documents again. When
+    it is refreshed, only new jobs and jobs with a modified document are read.
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self._entries = {}
+        self._refreshed = None
+        self.refresh()
+
+    def refresh(self):
+        """Update the index and return whether any job was added, removed or modified."""
+        self._refreshed = time.monotonic()
+        entries = {}
+        changed = False
+        for job in self.project:
+            try:
+                mtime = os.stat(job.document.filename).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            entry = self._entries.get(job.id)
+            if entry is None or entry["mtime"] != mtime:
+                entry = {
+                    "mtime": mtime,
+                    "title": ", ".join(f"{k} = {v}" for k, v in job.sp.items()),
+                    "score": job.doc.get("score"),
+                }
+                changed = True
+            entries[job.id] = entry
+        changed = changed or len(entries) != len(self._entries)
+        self._entries = entries
+        return changed
+
+    def refresh_if_stale(self):
+        """Refresh the index if it was not refreshed within REFRESH_INTERVAL."""
+        if time.monotonic() - self._refreshed < REFRESH_INTERVAL:
+            return False
+        return self.refresh()
+
+    def _entry(self, job):
+        if job.id not in self._entries:
+            self.refresh()
+        return self._entries[job.id]
+
+    def title(self, job):
+        return self._entry(job)["title"]
+
+    def score(self, job):
+        return self._entry(job)["score"]
+
+    def best(self, min_score=None):
+        """Return the entries sorted by descending score.
+
+        Entries without a score or with a score below min_score are omitted.
+        """
+        entries = [
+            entry
+            for entry in self._entries.values()
+            if entry["score"] is not None
+            and (min_score is None or entry["score"] >= min_score)
+        ]
+        return sorted(entries, key=lambda entry: entry["score"], reverse=True)
 
 
 class MLDashboard(Dashboard):
+    def __init__(self, index, **kwargs):
+        super().__init__(project=index.project, **kwargs)
+        self.index = index
+        # Writing a job document does not change the workspace directory, so
+        # the index is checked for modified documents before each request.
+        self.app.before_request(self._refresh_index)
+
+    def _refresh_index(self):
+        if self.index.refresh_if_stale():
+            # Clear the cached job lists, so that they are sorted again.
+            super().update_cache()
+
     def job_title(self, job):
-        return ", ".join(f"{k} = {v}" for k, v in job.sp.items())
+        return self.index.title(job)
+
+    def job_sorter(self, job):
+        # Sort by descending testing accuracy, jobs without a score last.
+        score = self.index.score(job)
+        return (score is None, -(score or 0))
+
+    def update_cache(self):
+        # Called whenever jobs are added to or removed from the workspace.
+        self.index.refresh()
+        super().update_cache()
 
 
 def testing_accuracy(job):
+    # The card is cached until the document changes, so the score is read
+    # from the document instead of the index, which is refreshed less often.
     return round(job.doc.score, 4)
 
 
 if __name__ == "__main__":
+    index = JobIndex(signac.get_project())
+
+    def best_models(project):
+        return "; ".join(
+            f"{entry['title']}: {round(entry['score'], 4)}"
+            for entry in index.best(MIN_SCORE)
+        )
+
     modules = [
-        StatepointList(),
-        ImageViewer(),
-        TextDisplay(name="Testing Accuracy", message=testing_accuracy),
+        CachedStatepointList(),
+        ThumbnailViewer(),
+        CachedTextDisplay(name="Testing Accuracy", message=testing_accuracy),
+        TextDisplay(name="Best Models", context="ProjectContext", message=best_models),
     ]
-    MLDashboard(modules=modules).main()
+    MLDashboard(index, modules=modules).main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Compare the per-job and the batched calculation of ideal-gas volumes."""
+
+import argparse
+import time
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import signac
+from idg import compute_volumes
+
+
+def compute_volumes_per_job(jobs):
+    """Calculate the ideal-gas volume of one job after another."""
+    for job in jobs:
+        job.document["V"] = job.sp.N * job.sp.kT / job.sp.p
+
+
+def main(args):
+    with TemporaryDirectory() as tmp:
+        project = signac.init_project(tmp)
+        print(f"Initializing {args.num_jobs} jobs...")
+        for p in np.linspace(0.1, 10.0, args.num_jobs):
+            project.open_job({"p": float(p), "kT": 1.0, "N": 1000}).init()
+
+        for func in (compute_volumes_per_job, compute_volumes):
+            jobs = list(signac.get_project(tmp))
+            start = time.perf_counter()
+            func(jobs)
+            elapsed = time.perf_counter() - start
+            print(f"{func.__name__}: {elapsed:.2f} s for {len(jobs)} jobs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--num-jobs",
+        type=int,
+        default=100000,
+        help="The number of jobs to benchmark.",
+    )
+    main(parser.parse_args())
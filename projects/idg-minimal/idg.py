@@ -1,15 +1,29 @@
+import numpy as np
 import signac
 
-project = signac.init_project()
 
-for p in [0.1, 1.0, 10.0]:
-    sp = {"p": p, "kT": 1.0, "N": 1000}
+def compute_volumes(jobs):
+    """Calculate the ideal-gas volume of all jobs at once."""
+    jobs = list(jobs)
+    if not jobs:
+        return
+    # Gather the state points into arrays and calculate all volumes at once.
+    N, kT, p = np.array([(job.sp.N, job.sp.kT, job.sp.p) for job in jobs]).T
+    V = N * kT / p
+    # All documents are written when leaving the buffered context.
+    with signac.buffered():
+        for job, volume in zip(jobs, V):
+            job.document["V"] = float(volume)
 
-    with project.open_job(sp) as job:
-        if "V" not in job.document:
-            V = sp["N"] * sp["kT"] / sp["p"]
-            job.document["V"] = V
 
+if __name__ == "__main__":
+    project = signac.init_project()
 
-for job in project:
-    print(job.sp.p, job.document["V"])
+    for p in [0.1, 1.0, 10.0]:
+        sp = {"p": p, "kT": 1.0, "N": 1000}
+        project.open_job(sp).init()
+
+    compute_volumes(job for job in project if "V" not in job.document)
+
+    for job in project:
+        print(job.sp.p, job.document["V"])
@@ -0,0 +1,103 @@
+# Copyright (c) 2017 The Regents of the University of Michigan
+# All rights reserved.
+# This software is licensed under the BSD 3-Clause License.
+"""Parse the README.md files of the example projects, with a shared cache.
+
+The description and the test code of each README.md file are stored in a
+cache file, together with the hash of the file content. Both flow-test.py and
+.update_project_readme.py read the metadata through this module, so that
+only new or modified README.md files are parsed again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from mistune import BlockLexer
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".readme_cache.json"
+)
+
+
+def _find_descr(blocks):
+    "The first paragraph is interpreted as the description."
+    for block in blocks:
+        if block["type"] == "paragraph":
+            return block["text"]
+
+
+def _find_test_code(blocks):
+    "All code blocks within a 'using' or 'testing' section."
+    found = False
+    for block in blocks:
+        if found and block["type"] == "code":
+            yield block["text"]
+        if block["type"] == "heading":
+            found = block["text"].lower() in ("usage", "testing")
+
+
+def parse_readme(text):
+    blocks = BlockLexer().parse(text)
+    return {
+        "description": _find_descr(blocks),
+        "test_code": "\n".join(_find_test_code(blocks)),
+    }
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _store_cache(cache):
+    tmp = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+
+def read_metadata(filenames):
+    """Return the metadata of the README.md files as a dict keyed by filename.
+
+    Files that are not in the cache or that were modified are parsed
+    concurrently, and their metadata is stored in the cache.
+    """
+    root = os.path.dirname(CACHE_FILE)
+    texts = {}
+    hashes = {}
+    for filename in filenames:
+        with open(filename) as file:
+            texts[filename] = file.read()
+        hashes[filename] = hashlib.sha256(texts[filename].encode()).hexdigest()
+    cache = _load_cache()
+    entries = {
+        filename: cache.get(os.path.relpath(os.path.abspath(filename), root))
+        for filename in filenames
+    }
+    missing = [
+        filename
+        for filename, entry in entries.items()
+        if entry is None or entry["sha256"] != hashes[filename]
+    ]
+    logger.debug(
+        f"README metadata: {len(entries) - len(missing)} cached, {len(missing)} parsed."
+    )
+    if missing:
+        if len(missing) == 1:
+            parsed = [parse_readme(texts[missing[0]])]
+        else:
+            with ProcessPoolExecutor() as executor:
+                parsed = list(executor.map(parse_readme, [texts[fn] for fn in missing]))
+        for filename, metadata in zip(missing, parsed):
+            entries[filename] = dict(metadata, sha256=hashes[filename])
+            cache[os.path.relpath(os.path.abspath(filename), root)] = entries[filename]
+        _store_cache(cache)
+    return entries